@@ -1,11 +1,22 @@
 import osmnx as ox
 import networkx as nx
 import pulp
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpBinary
+from pulp import LpProblem, LpMinimize, LpVariable, LpAffineExpression, LpBinary
+from itertools import chain
+import os
+import pickle
 import random
+from math import asin, cos, sin, sqrt
+import numpy as np
+from scipy.spatial import cKDTree
 import folium
 from folium import Element
-from geopy.distance import geodesic
+
+try:
+    from numba import njit, prange
+except ImportError:
+    # Sem Numba, as matrizes de distância são calculadas com NumPy puro
+    njit = None
 
 # ---
 # 1. CONFIGURAÇÃO E PARÂMETROS
@@ -15,6 +26,10 @@ print("Inicializando Otimização OpenRAN - Cenário Carnaval & REMESSA (V3 com
 
 random.seed(42)  # Reprodutibilidade
 
+# Cache em disco das respostas do Overpass (pasta ./cache)
+ox.settings.use_cache = True
+ox.settings.cache_folder = "./cache"
+
 # --- 1.1 Coordenadas Fixas (Âncoras Reais) ---
 LOCAIS_FIXOS = {
     "POLITECNICA": (-12.9996194, -38.5103449),  # Centro de Controle Acadêmico
@@ -50,12 +65,107 @@ MAX_DIST_MH_METROS = 9000   # Midhaul (DU -> CU)
 CAP_DU = 8  # RUs por DU
 CAP_CU = 20 # DUs por CU
 
+# Fator de correção da distância em linha reta para o traçado real da fibra
+FATOR_ROTA = 1.3
+# Raio médio da Terra (fórmula de haversine)
+RAIO_TERRA_METROS = 6371008.8
+
+# --- 1.6 Solver ---
+SOLVER_GAP_REL = 0.01   # Encerra o branch-and-bound a 1% da solução ótima
+SOLVER_TIME_LIMIT = 60  # segundos
+
 # ---
 # 2. FUNÇÕES AUXILIARES
 # ---
 
-def calcular_distancia_geodesica(coord1, coord2):
-    return geodesic(coord1, coord2).meters
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _preencher_distancias(lat1, lon1, lat2, lon2, fator, out):
+        # Haversine par a par, compilado pelo Numba; as linhas rodam em paralelo
+        for i in prange(lat1.size):
+            for j in range(lat2.size):
+                a = (sin((lat1[i] - lat2[j]) / 2) ** 2
+                     + cos(lat1[i]) * cos(lat2[j]) * sin((lon1[i] - lon2[j]) / 2) ** 2)
+                out[i, j] = 2 * RAIO_TERRA_METROS * asin(sqrt(a)) * fator
+
+def matriz_distancias(coords1, coords2, fator=1.0):
+    """
+    Distâncias (haversine, em metros) entre todos os pares de coords1 x coords2,
+    multiplicadas por `fator`.
+    Retorna um np.ndarray de formato (len(coords1), len(coords2)).
+    """
+    rad1 = np.radians(np.asarray(coords1, dtype=float))
+    rad2 = np.radians(np.asarray(coords2, dtype=float))
+    lat1, lon1 = np.ascontiguousarray(rad1[:, 0]), np.ascontiguousarray(rad1[:, 1])
+    lat2, lon2 = np.ascontiguousarray(rad2[:, 0]), np.ascontiguousarray(rad2[:, 1])
+
+    if njit is not None:
+        out = np.empty((lat1.size, lat2.size))
+        _preencher_distancias(lat1, lon1, lat2, lon2, fator, out)
+        return out
+
+    dlat = lat1[:, None] - lat2[None, :]
+    dlon = lon1[:, None] - lon2[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1[:, None]) * np.cos(lat2[None, :]) * np.sin(dlon / 2) ** 2
+    return 2 * RAIO_TERRA_METROS * np.arcsin(np.sqrt(a)) * fator
+
+def coords_cartesianas(coords):
+    """
+    Projeta coordenadas (lat, lon) em posições (x, y, z), em metros, na mesma
+    esfera usada pelo haversine. A distância euclidiana (corda) entre dois
+    pontos é função crescente da distância de haversine, então buscas por raio
+    numa cKDTree dão o mesmo resultado que a matriz de distâncias.
+    """
+    lat, lon = np.radians(np.asarray(coords, dtype=float)).T
+    return RAIO_TERRA_METROS * np.column_stack((np.cos(lat) * np.cos(lon),
+                                                np.cos(lat) * np.sin(lon),
+                                                np.sin(lat)))
+
+def raio_corda(distancia):
+    """Converte uma distância de haversine (metros) no raio de corda equivalente."""
+    return 2 * RAIO_TERRA_METROS * np.sin(distancia / (2 * RAIO_TERRA_METROS))
+
+def solucao_gulosa(rus, links_fh, links_mh, dist_fh, dist_mh, cap_du, cap_cu):
+    """
+    Heurística gulosa para o warm start do solver. As RUs, da mais isolada
+    (maior distância até a DU viável mais próxima) para a menos isolada, vão
+    para a DU viável mais próxima com capacidade livre; as DUs são abertas
+    conforme recebem RUs.
+    Depois, cada DU aberta vai para a CU viável mais próxima com capacidade.
+    Retorna (ru -> du, du -> cu), ou None se a heurística não conseguir
+    atender todas as RUs/DUs.
+    """
+    dus_por_ru = {i: [] for i in rus}
+    for (i, j) in links_fh:
+        dus_por_ru[i].append(j)
+    cus_por_du = {}
+    for (j, k) in links_mh:
+        cus_por_du.setdefault(j, []).append(k)
+
+    def isolamento(i):
+        return min((dist_fh[i, j] for j in dus_por_ru[i]), default=float('inf'))
+
+    carga_du = {}
+    atrib_fh = {}
+    for i in sorted(rus, key=isolamento, reverse=True):
+        livres = [j for j in dus_por_ru[i] if carga_du.get(j, 0) < cap_du]
+        if not livres:
+            return None
+        j = min(livres, key=lambda j: dist_fh[i, j])
+        atrib_fh[i] = j
+        carga_du[j] = carga_du.get(j, 0) + 1
+
+    carga_cu = {}
+    atrib_mh = {}
+    for j in carga_du:
+        livres = [k for k in cus_por_du.get(j, []) if carga_cu.get(k, 0) < cap_cu]
+        if not livres:
+            return None
+        k = min(livres, key=lambda k: dist_mh[j, k])
+        atrib_mh[j] = k
+        carga_cu[k] = carga_cu.get(k, 0) + 1
+
+    return atrib_fh, atrib_mh
 
 def gerar_pontos_carnaval(inicio, fim, quantidade):
     pontos = []
@@ -76,71 +186,72 @@ def gerar_pontos_carnaval(inicio, fim, quantidade):
 # ---
 
 print(f"Baixando malha viária (Raio: {RAIO_AREA_KM}km)...")
-G = ox.graph_from_point(PONTO_CENTRAL, dist=RAIO_AREA_METROS, network_type='drive')
-nodos_validos = list(G.nodes(data=True))
+# Grafo salvo em pickle por ponto central/raio: evita refazer download e processamento
+arquivo_grafo = os.path.join(
+    ox.settings.cache_folder,
+    f"grafo_drive_{PONTO_CENTRAL[0]:.6f}_{PONTO_CENTRAL[1]:.6f}_{RAIO_AREA_METROS:.0f}m.pkl")
+if os.path.exists(arquivo_grafo):
+    with open(arquivo_grafo, 'rb') as f:
+        G = pickle.load(f)
+    print(f"Malha viária carregada do cache: {arquivo_grafo}")
+else:
+    G = ox.graph_from_point(PONTO_CENTRAL, dist=RAIO_AREA_METROS, network_type='drive')
+    os.makedirs(ox.settings.cache_folder, exist_ok=True)
+    with open(arquivo_grafo, 'wb') as f:
+        pickle.dump(G, f)
+# Coordenadas (lat, lon) de todos os nós da malha, num array (N, 2)
+coords_nodos = np.array([(d['y'], d['x']) for _, d in G.nodes(data=True)])
 
 # 3.1 Gerar RUs (Demanda)
 coords_carnaval = gerar_pontos_carnaval(LOCAIS_FIXOS["FAROL_BARRA"], LOCAIS_FIXOS["ONDINA_FIM"], NUM_RUS_CARNAVAL)
-coords_dispersas = []
-for _ in range(NUM_RUS_DISPERSAS):
-    node = random.choice(nodos_validos)
-    coords_dispersas.append((node[1]['y'], node[1]['x']))
+
+# Um único sorteio, sem repetição, para RUs dispersas e candidatos a DU/CU
+total_sorteio = NUM_RUS_DISPERSAS + NUM_CANDIDATOS_DU + NUM_CANDIDATOS_CU_EXTRA
+idx_sorteados = random.sample(range(len(coords_nodos)), total_sorteio)
+coords_sorteadas = [tuple(c) for c in coords_nodos[idx_sorteados].tolist()]
+
+coords_dispersas = coords_sorteadas[:NUM_RUS_DISPERSAS]
 
 lista_rus = coords_carnaval + coords_dispersas
 print(f"Total de RUs geradas: {len(lista_rus)}")
 
 # 3.2 Gerar Candidatos a DU
-candidatos_du = []
-for _ in range(NUM_CANDIDATOS_DU):
-    node = random.choice(nodos_validos)
-    candidatos_du.append((node[1]['y'], node[1]['x']))
+candidatos_du = coords_sorteadas[NUM_RUS_DISPERSAS : NUM_RUS_DISPERSAS + NUM_CANDIDATOS_DU]
 candidatos_du.append(LOCAIS_FIXOS["STI_UFBA"])
 candidatos_du.append(LOCAIS_FIXOS["IFBA_BARBALHO"])
 
 # 3.3 Gerar Candidatos a CU
 candidatos_cu_fixos = [LOCAIS_FIXOS["STI_UFBA"], LOCAIS_FIXOS["IFBA_BARBALHO"]]
-candidatos_cu_novos = []
-for _ in range(NUM_CANDIDATOS_CU_EXTRA):
-    node = random.choice(nodos_validos)
-    candidatos_cu_novos.append((node[1]['y'], node[1]['x']))
+candidatos_cu_novos = coords_sorteadas[NUM_RUS_DISPERSAS + NUM_CANDIDATOS_DU :]
 
 lista_candidatos_cu = candidatos_cu_fixos + candidatos_cu_novos
+# Os CUs fixos vêm primeiro na lista
+idx_cu_fixos = set(range(len(candidatos_cu_fixos)))
 
 # ---
 # 4. CÁLCULO DE CUSTOS E PRÉ-CHECK
 # ---
 print("Calculando matrizes de custos e verificando viabilidade...")
 
-dist_ru_du = {}
-dist_du_cu = {}
-
 idx_ru = range(len(lista_rus))
 idx_du = range(len(candidatos_du))
 idx_cu = range(len(lista_candidatos_cu))
 
-# RU -> DU
+# Pré-check: RUs sem nenhuma DU candidata ao alcance do fronthaul
+# (busca por raio numa cKDTree das DUs, antes de montar a matriz RU -> DU)
+arvore_du = cKDTree(coords_cartesianas(candidatos_du))
+dus_alcance = arvore_du.query_ball_point(coords_cartesianas(lista_rus),
+                                         r=raio_corda(MAX_DIST_FH_METROS / FATOR_ROTA))
 for i in idx_ru:
-    du_viavel_encontrada = False
-    for j in idx_du:
-        dist = calcular_distancia_geodesica(lista_rus[i], candidatos_du[j])
-        dist_real = dist * 1.3 
-        dist_ru_du[(i, j)] = dist_real
-        if dist_real <= MAX_DIST_FH_METROS:
-            du_viavel_encontrada = True
-    
-    if not du_viavel_encontrada:
+    if not dus_alcance[i]:
         print(f" ALERTA: RU {i} isolada. Movendo para perto do STI.")
-        lista_rus[i] = LOCAIS_FIXOS["STI_UFBA"] 
-        for j in idx_du:
-            dist = calcular_distancia_geodesica(lista_rus[i], candidatos_du[j])
-            dist_ru_du[(i, j)] = dist * 1.3
+        lista_rus[i] = LOCAIS_FIXOS["STI_UFBA"]
+
+# RU -> DU
+dist_ru_du = matriz_distancias(lista_rus, candidatos_du, FATOR_ROTA)
 
 # DU -> CU
-for j in idx_du:
-    for k in idx_cu:
-        dist = calcular_distancia_geodesica(candidatos_du[j], lista_candidatos_cu[k])
-        dist_real = dist * 1.3
-        dist_du_cu[(j, k)] = dist_real
+dist_du_cu = matriz_distancias(candidatos_du, lista_candidatos_cu, FATOR_ROTA)
 
 # ---
 # 5. OTIMIZAÇÃO (PLI)
@@ -150,61 +261,119 @@ print("Executando Solver de Otimização...")
 prob = LpProblem("OpenRAN_Salvador_Carnaval", LpMinimize)
 
 # Variáveis
-y = LpVariable.dicts("DU_Ativa", idx_du, cat=LpBinary)
-z = LpVariable.dicts("CU_Ativa", idx_cu, cat=LpBinary)
-x = LpVariable.dicts("Link_RU_DU", [(i, j) for i in idx_ru for j in idx_du], cat=LpBinary)
-w = LpVariable.dicts("Link_DU_CU", [(j, k) for j in idx_du for k in idx_cu], cat=LpBinary)
+# Criadas direto em dicionários (sem o overhead do LpVariable.dicts)
+y = {j: LpVariable(f"DU_Ativa_{j}", cat=LpBinary) for j in idx_du}
+z = {k: LpVariable(f"CU_Ativa_{k}", cat=LpBinary) for k in idx_cu}
+# Links acima do limite de distância não viram variáveis. Os links viáveis
+# ficam em arrays planos (origem, destino), como numa matriz esparsa COO
+ru_fh, du_fh = np.nonzero(dist_ru_du <= MAX_DIST_FH_METROS)
+du_mh, cu_mh = np.nonzero(dist_du_cu <= MAX_DIST_MH_METROS)
+x_keys = list(zip(ru_fh.tolist(), du_fh.tolist()))
+w_keys = list(zip(du_mh.tolist(), cu_mh.tolist()))
+x = {(i, j): LpVariable(f"Link_RU_DU_{i}_{j}", cat=LpBinary) for (i, j) in x_keys}
+w = {(j, k): LpVariable(f"Link_DU_CU_{j}_{k}", cat=LpBinary) for (j, k) in w_keys}
+
+# Listas de adjacência dos links viáveis, usadas nas restrições
+dus_por_ru = {i: [] for i in idx_ru}
+rus_por_du = {j: [] for j in idx_du}
+for (i, j) in x_keys:
+    dus_por_ru[i].append(j)
+    rus_por_du[j].append(i)
+cus_por_du = {j: [] for j in idx_du}
+dus_por_cu = {k: [] for k in idx_cu}
+for (j, k) in w_keys:
+    cus_por_du[j].append(k)
+    dus_por_cu[k].append(j)
 
 # Função Objetivo
-custo_dus = lpSum(COSTO_INST_DU * y[j] for j in idx_du)
-custo_cus = 0
-for k in idx_cu:
-    loc = lista_candidatos_cu[k]
-    if loc in candidatos_cu_fixos:
-        custo_cus += COSTO_INST_CU_EXISTENTE * z[k]
-    else:
-        custo_cus += COSTO_INST_CU_NOVA * z[k]
-
-custo_fh = lpSum(dist_ru_du[i, j] * COSTO_FIBRA_METRO * x[i, j] for i in idx_ru for j in idx_du)
-custo_mh = lpSum(dist_du_cu[j, k] * COSTO_FIBRA_METRO * w[j, k] for j in idx_du for k in idx_cu)
+# Expressões montadas direto de pares (variável, coeficiente), sem lpSum
+custo_dus = LpAffineExpression((y[j], COSTO_INST_DU) for j in idx_du)
+custo_cus = LpAffineExpression(
+    (z[k], COSTO_INST_CU_EXISTENTE if k in idx_cu_fixos else COSTO_INST_CU_NOVA)
+    for k in idx_cu
+)
+
+# Coeficientes dos links calculados de uma vez sobre os arrays (x e w estão na
+# mesma ordem de x_keys/w_keys)
+coefs_fh = (dist_ru_du[ru_fh, du_fh] * COSTO_FIBRA_METRO).tolist()
+coefs_mh = (dist_du_cu[du_mh, cu_mh] * COSTO_FIBRA_METRO).tolist()
+custo_fh = LpAffineExpression(zip(x.values(), coefs_fh))
+custo_mh = LpAffineExpression(zip(w.values(), coefs_mh))
 
 prob += custo_dus + custo_cus + custo_fh + custo_mh
 
 # Restrições
 for i in idx_ru:
-    prob += lpSum(x[i, j] for j in idx_du) == 1
+    prob += LpAffineExpression((x[i, j], 1) for j in dus_por_ru[i]) == 1
 
 for j in idx_du:
-    prob += lpSum(x[i, j] for i in idx_ru) <= CAP_DU * y[j]
-    for i in idx_ru:
-        prob += x[i, j] <= y[j]
+    prob += LpAffineExpression(chain(((x[i, j], 1) for i in rus_por_du[j]), [(y[j], -CAP_DU)])) <= 0
+    # DU só é ativada se atender pelo menos uma RU (aperta a relaxação linear)
+    prob += LpAffineExpression(chain(((x[i, j], 1) for i in rus_por_du[j]), [(y[j], -1)])) >= 0
+
+for (i, j) in x_keys:
+    prob += x[i, j] <= y[j]
 
 for j in idx_du:
-    prob += lpSum(w[j, k] for k in idx_cu) == y[j]
+    prob += LpAffineExpression(chain(((w[j, k], 1) for k in cus_por_du[j]), [(y[j], -1)])) == 0
 
 for k in idx_cu:
-    prob += lpSum(w[j, k] for j in idx_du) <= CAP_CU * z[k]
-    for j in idx_du:
-        prob += w[j, k] <= z[k]
-
-for i in idx_ru:
-    for j in idx_du:
-        if dist_ru_du[(i, j)] > MAX_DIST_FH_METROS:
-            prob += x[i, j] == 0
-
-for j in idx_du:
-    for k in idx_cu:
-        if dist_du_cu[(j, k)] > MAX_DIST_MH_METROS:
-            prob += w[j, k] == 0
+    prob += LpAffineExpression(chain(((w[j, k], 1) for j in dus_por_cu[k]), [(z[k], -CAP_CU)])) <= 0
+
+for (j, k) in w_keys:
+    prob += w[j, k] <= z[k]
+
+# Warm start: solução inicial gulosa, que dá ao solver um limite primal desde o início
+inicial = solucao_gulosa(idx_ru, x_keys, w_keys, dist_ru_du, dist_du_cu, CAP_DU, CAP_CU)
+usar_warm_start = inicial is not None
+if usar_warm_start:
+    atrib_fh, atrib_mh = inicial
+    cus_abertas = set(atrib_mh.values())
+    for j, var in y.items():
+        var.setInitialValue(1 if j in atrib_mh else 0)
+    for k, var in z.items():
+        var.setInitialValue(1 if k in cus_abertas else 0)
+    for (i, j), var in x.items():
+        var.setInitialValue(1 if atrib_fh[i] == j else 0)
+    for (j, k), var in w.items():
+        var.setInitialValue(1 if atrib_mh.get(j) == k else 0)
+else:
+    print("Heurística gulosa não encontrou solução inicial. Seguindo sem warm start.")
 
-prob.solve()
+# Preferência: HiGHS via highspy (modelo em memória, sem arquivo intermediário),
+# depois HiGHS por linha de comando e, por fim, CBC. Com warm start, os solvers
+# por linha de comando (que recebem a solução inicial) vêm primeiro.
+if usar_warm_start:
+    classes_solver = (pulp.HiGHS_CMD, pulp.PULP_CBC_CMD, pulp.HiGHS)
+else:
+    classes_solver = (pulp.HiGHS, pulp.HiGHS_CMD, pulp.PULP_CBC_CMD)
+for classe_solver in classes_solver:
+    opcoes_solver = dict(msg=False, gapRel=SOLVER_GAP_REL, timeLimit=SOLVER_TIME_LIMIT)
+    # pulp.HiGHS (highspy) não suporta warmStart: a opção seria repassada ao
+    # HiGHS como parâmetro desconhecido e a solução inicial, ignorada.
+    if classe_solver is not pulp.HiGHS:
+        opcoes_solver['warmStart'] = usar_warm_start
+    solver = classe_solver(**opcoes_solver)
+    if solver.available():
+        break
+print(f"Solver utilizado: {solver.name}")
+prob.solve(solver)
 print(f"Status: {pulp.LpStatus[prob.status]}")
+# Com gap relativo e limite de tempo, o status "Optimal" não garante uma solução
+# comprovadamente ótima: o sol_status distingue a ótima (dentro do gap) da
+# melhor solução viável encontrada até o limite de tempo.
+solucao_encontrada = prob.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible)
 
 # ---
 # 6. VISUALIZAÇÃO E RESULTADOS
 # ---
-if pulp.LpStatus[prob.status] == "Optimal":
-    print(f"Custo Total Estimado: R$ {pulp.value(prob.objective):,.2f}")
+if solucao_encontrada:
+    if prob.sol_status == pulp.LpSolutionOptimal:
+        print(f"Custo Total Estimado: R$ {pulp.value(prob.objective):,.2f} "
+              f"(ótimo, gap relativo de até {SOLVER_GAP_REL:.0%})")
+    else:
+        print(f"Custo Total Estimado: R$ {pulp.value(prob.objective):,.2f} "
+              f"(melhor solução em {SOLVER_TIME_LIMIT}s, não comprovadamente ótima)")
     
     m = folium.Map(location=PONTO_CENTRAL, zoom_start=13, tiles="CartoDB positron")
 
@@ -220,7 +389,7 @@ if pulp.LpStatus[prob.status] == "Optimal":
     for k in idx_cu:
         if z[k].varValue > 0.9:
             loc = lista_candidatos_cu[k]
-            cor = "red" if loc in candidatos_cu_fixos else "orange"
+            cor = "red" if k in idx_cu_fixos else "orange"
             folium.Marker(loc, popup="CU Ativa", icon=folium.Icon(color=cor, icon='cloud', prefix='fa')).add_to(m)
 
     for j in idx_du:
@@ -228,17 +397,22 @@ if pulp.LpStatus[prob.status] == "Optimal":
             loc_du = candidatos_du[j]
             folium.CircleMarker(loc_du, radius=6, color='blue', fill=True, fill_opacity=1, popup="DU OpenRAN").add_to(m)
             for k in idx_cu:
-                if w[(j, k)].varValue > 0.9:
+                if (j, k) in w and w[(j, k)].varValue > 0.9:
                     loc_cu = lista_candidatos_cu[k]
                     folium.PolyLine([loc_du, loc_cu], color='blue', weight=2.5, opacity=0.6, popup="Midhaul").add_to(m)
 
+    # RUs a menos de 50 m de algum ponto do circuito do Carnaval
+    # (busca por raio numa cKDTree dos pontos do circuito)
+    arvore_carnaval = cKDTree(coords_cartesianas(coords_carnaval))
+    eh_carnaval = arvore_carnaval.query_ball_point(coords_cartesianas(lista_rus), r=raio_corda(50),
+                                                   return_length=True) > 0
+
     for i in idx_ru:
         loc_ru = lista_rus[i]
-        eh_carnaval = any(calcular_distancia_geodesica(loc_ru, c) < 50 for c in coords_carnaval)
-        cor_ru = "green" if eh_carnaval else "gray"
+        cor_ru = "green" if eh_carnaval[i] else "gray"
         folium.CircleMarker(loc_ru, radius=4, color=cor_ru, fill=True, fill_opacity=0.8, popup="RU 5G").add_to(m)
         for j in idx_du:
-            if x[(i, j)].varValue > 0.9:
+            if (i, j) in x and x[(i, j)].varValue > 0.9:
                 loc_du = candidatos_du[j]
                 folium.PolyLine([loc_ru, loc_du], color='green', weight=1, opacity=0.5).add_to(m)
 
@@ -1,9 +1,13 @@
 import osmnx as ox
 import networkx as nx
 import pulp
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpBinary
+from pulp import LpProblem, LpMinimize, LpVariable, LpAffineExpression, LpBinary, LpContinuous
+from itertools import chain
 import random
 import folium
+from folium.plugins import FastMarkerCluster
+import os
+import pickle
 import time
 
 # ---
@@ -14,6 +18,10 @@ print("Inicializando script de otimização OpenRAN...")
 
 random.seed(42)
 
+# Cache em disco das respostas do Overpass/Nominatim (pasta ./cache)
+ox.settings.use_cache = True
+ox.settings.cache_folder = "./cache"
+
 # --- 1.1 Parâmetros Geográficos ---
 # Ponto central da simulação (Escola Politécnica da UFBA)
 # Geocodificação do local
@@ -56,21 +64,70 @@ MAX_DIST_MH_METROS = 4000 # ANTERIOR: 2500
 CAP_DU = 7  # ANTERIOR: 6
 CAP_CU = 6  # ANTERIOR: 5
 
+# --- 1.5 Parâmetros do Solver ---
+# HiGHS é bem mais rápido que o CBC padrão nestas instâncias; o gap relativo
+# permite encerrar o branch-and-bound assim que a solução estiver a 1% da ótima.
+SOLVER_GAP_REL = 0.01
+SOLVER_TIME_LIMIT = 60  # segundos
+
 # ---
-# 2. FUNÇÃO AUXILIAR PARA CÁLCULO DE DISTÂNCIA
+# 2. FUNÇÕES AUXILIARES
 # ---
-def get_street_distance(graph, node1, node2):
+def get_street_routes(graph, origem, destinos):
+    """
+    Calcula a distância e a rota mais curtas pela malha viária de um nó de
+    origem até cada um dos nós de destino, com uma única execução de Dijkstra.
+    As rotas são guardadas para o desenho do mapa (seção 8).
     """
-    Calcula a distância mais curta pela malha viária entre dois nós do grafo.
+    # Dijkstra de fonte única (peso 'length') a partir da origem
+    lengths, paths = nx.single_source_dijkstra(graph, origem, weight='length')
+    # Destinos sem caminho de rua (ex: ilhas desconectadas no grafo) recebem
+    # um valor "infinito" para tornar esse link inviável
+    distancias = {destino: lengths.get(destino, 1e9) for destino in destinos} # 1 bilhão de metros
+    rotas = {destino: paths[destino] for destino in destinos if destino in paths}
+    return distancias, rotas
+
+def solucao_gulosa(rus, links_fh, links_mh, dist_fh, dist_mh, cap_du, cap_cu):
     """
-    try:
-        # Usa o algoritmo de Dijkstra (padrão do networkx) com peso 'length'
-        length = nx.shortest_path_length(graph, node1, node2, weight='length')
-        return length
-    except nx.NetworkXNoPath:
-        # Se não houver caminho de rua (ex: ilhas desconectadas no grafo)
-        # Retorna um valor "infinito" para tornar esse link inviável
-        return 1e9 # 1 bilhão de metros
+    Heurística gulosa para o warm start do solver. As RUs, da mais isolada
+    (maior distância até a DU viável mais próxima) para a menos isolada, vão
+    para a DU viável mais próxima com capacidade livre; as DUs são abertas
+    conforme recebem RUs.
+    Depois, cada DU aberta vai para a CU viável mais próxima com capacidade.
+    Retorna (ru -> du, du -> cu), ou None se a heurística não conseguir
+    atender todas as RUs/DUs.
+    """
+    dus_por_ru = {i: [] for i in rus}
+    for (i, j) in links_fh:
+        dus_por_ru[i].append(j)
+    cus_por_du = {}
+    for (j, k) in links_mh:
+        cus_por_du.setdefault(j, []).append(k)
+
+    def isolamento(i):
+        return min((dist_fh[i, j] for j in dus_por_ru[i]), default=float('inf'))
+
+    carga_du = {}
+    atrib_fh = {}
+    for i in sorted(rus, key=isolamento, reverse=True):
+        livres = [j for j in dus_por_ru[i] if carga_du.get(j, 0) < cap_du]
+        if not livres:
+            return None
+        j = min(livres, key=lambda j: dist_fh[i, j])
+        atrib_fh[i] = j
+        carga_du[j] = carga_du.get(j, 0) + 1
+
+    carga_cu = {}
+    atrib_mh = {}
+    for j in carga_du:
+        livres = [k for k in cus_por_du.get(j, []) if carga_cu.get(k, 0) < cap_cu]
+        if not livres:
+            return None
+        k = min(livres, key=lambda k: dist_mh[j, k])
+        atrib_mh[j] = k
+        carga_cu[k] = carga_cu.get(k, 0) + 1
+
+    return atrib_fh, atrib_mh
 
 # ---
 # 3. AQUISIÇÃO E PREPARAÇÃO DOS DADOS GEOGRÁFICOS (OSMnx)
@@ -79,7 +136,20 @@ def get_street_distance(graph, node1, node2):
 print(f"Baixando malha viária de {RAIO_AREA_KM}km ao redor do ponto central...")
 # Baixa o grafo da malha viária (ruas)
 # 'drive' inclui apenas ruas acessíveis por carros
-G = ox.graph_from_point(PONTO_CENTRAL, dist=RAIO_AREA_METROS, network_type='drive')
+# O grafo baixado é salvo em pickle (um arquivo por ponto central/raio), para que
+# as próximas execuções não precisem refazer o download e o processamento.
+arquivo_grafo = os.path.join(
+    ox.settings.cache_folder,
+    f"grafo_drive_{PONTO_CENTRAL[0]:.6f}_{PONTO_CENTRAL[1]:.6f}_{RAIO_AREA_METROS:.0f}m.pkl")
+if os.path.exists(arquivo_grafo):
+    with open(arquivo_grafo, 'rb') as f:
+        G = pickle.load(f)
+    print(f"Malha viária carregada do cache: {arquivo_grafo}")
+else:
+    G = ox.graph_from_point(PONTO_CENTRAL, dist=RAIO_AREA_METROS, network_type='drive')
+    os.makedirs(ox.settings.cache_folder, exist_ok=True)
+    with open(arquivo_grafo, 'wb') as f:
+        pickle.dump(G, f)
 # Converte para um grafo não-direcionado para facilitar o roteamento
 G_undir = G.to_undirected()
 print("Malha viária baixada e processada.")
@@ -119,15 +189,23 @@ start_time = time.time()
 
 # Distâncias RU -> DU (Fronthaul)
 dist_ru_du = {}
+rotas_ru_du = {}
 for i in nos_ru:
+    lengths_i, paths_i = get_street_routes(G_undir, i, nos_du_candidatos)
     for j in nos_du_candidatos:
-        dist_ru_du[i, j] = get_street_distance(G_undir, i, j)
+        dist_ru_du[i, j] = lengths_i[j]
+        if j in paths_i:
+            rotas_ru_du[i, j] = paths_i[j]
 
 # Distâncias DU -> CU (Midhaul)
 dist_du_cu = {}
+rotas_du_cu = {}
 for j in nos_du_candidatos:
+    lengths_j, paths_j = get_street_routes(G_undir, j, nos_cu_candidatos)
     for k in nos_cu_candidatos:
-        dist_du_cu[j, k] = get_street_distance(G_undir, j, k)
+        dist_du_cu[j, k] = lengths_j[k]
+        if k in paths_j:
+            rotas_du_cu[j, k] = paths_j[k]
 
 end_time = time.time()
 print(f"Distâncias calculadas em {end_time - start_time:.2f} segundos.")
@@ -144,41 +222,62 @@ print("Formulando o problema de Programação Linear Inteira...")
 prob = LpProblem("Otimizacao_OpenRAN_PCC", LpMinimize)
 
 # 5.2 Definição das Variáveis de Decisão
-# Variáveis Binárias (0 ou 1) que o solver irá decidir
+# Variáveis Binárias (0 ou 1) que o solver irá decidir (exceto w, ver abaixo)
 
 # y_j: 1 se a DU for instalada no local candidato j
-y = LpVariable.dicts("DU_Ativada", nos_du_candidatos, cat=LpBinary)
+y = {j: LpVariable(f"DU_Ativada_{j}", cat=LpBinary) for j in nos_du_candidatos}
 
 # z_k: 1 se a CU for instalada no local candidato k
-z = LpVariable.dicts("CU_Ativada", nos_cu_candidatos, cat=LpBinary)
+z = {k: LpVariable(f"CU_Ativada_{k}", cat=LpBinary) for k in nos_cu_candidatos}
 
 # As chaves (keys) para as variáveis x e w devem ser os pares (i,j) e (j,k).
-# O método LpVariable.dicts precisa de uma lista desses pares (tuplas).
-# Vamos pegar esses pares diretamente dos dicionários de distância que já criamos.
+# Vamos pegar esses pares diretamente dos dicionários de distância que já criamos,
+# mas apenas os que respeitam o limite de distância/latência: um link acima do
+# limite nem chega a virar variável (em vez de ser fixado em zero depois).
+# As variáveis são criadas direto num dicionário indexado por esses pares (tuplas),
+# sem passar pelo LpVariable.dicts (que normaliza chaves e nomes um a um).
 
-x_keys = dist_ru_du.keys()
-w_keys = dist_du_cu.keys()
+x_keys = [(i, j) for (i, j), dist in dist_ru_du.items() if dist <= MAX_DIST_FH_METROS]
+w_keys = [(j, k) for (j, k), dist in dist_du_cu.items() if dist <= MAX_DIST_MH_METROS]
 
 # x_ij: 1 se a RU i for conectada à DU j
-x = LpVariable.dicts("Link_RU_DU", x_keys, cat=LpBinary)
+x = {(i, j): LpVariable(f"Link_RU_DU_{i}_{j}", cat=LpBinary) for (i, j) in x_keys}
 
 # w_jk: 1 se a DU j for conectada à CU k
-w = LpVariable.dicts("Link_DU_CU", w_keys, cat=LpBinary)
+# Declarada contínua em [0, 1]: com y e z binários, o que sobra para w é um
+# problema de transporte (oferta y[j] inteira, capacidades CAP_CU inteiras),
+# cuja matriz é totalmente unimodular. As soluções básicas, que o solver
+# retorna, são inteiras, e o branch-and-bound não precisa ramificar em w.
+w = {(j, k): LpVariable(f"Link_DU_CU_{j}_{k}", lowBound=0, upBound=1, cat=LpContinuous) for (j, k) in w_keys}
+
+# Listas de adjacência dos links viáveis: cada restrição percorre só os links
+# que existem, em vez de testar todos os pares candidatos
+dus_por_ru = {i: [] for i in nos_ru}
+rus_por_du = {j: [] for j in nos_du_candidatos}
+for (i, j) in x_keys:
+    dus_por_ru[i].append(j)
+    rus_por_du[j].append(i)
+cus_por_du = {j: [] for j in nos_du_candidatos}
+dus_por_cu = {k: [] for k in nos_cu_candidatos}
+for (j, k) in w_keys:
+    cus_por_du[j].append(k)
+    dus_por_cu[k].append(j)
 
 
 # 5.3 Definição da Função Objetivo
 # Custo Total = Custo de Instalação + Custo dos Links
 # Inspirado nos artigos (minimizar custos de ativação e número de PPs ativos)
-custo_instalacao_du = lpSum(COSTO_INST_DU * y[j] for j in nos_du_candidatos)
-custo_instalacao_cu = lpSum(COSTO_INST_CU * z[k] for k in nos_cu_candidatos)
-
-# Agora o acesso x[i, j] (que é x[(i,j)]) vai funcionar, pois as chaves de x
-# são as mesmas chaves de dist_ru_du.
-custo_links_fh = lpSum(dist_ru_du[i, j] * COSTO_LINK_FH * x[i, j]
-                       for (i, j) in x_keys)
-                       
-custo_links_mh = lpSum(dist_du_cu[j, k] * COSTO_LINK_MH * w[j, k]
-                       for (j, k) in w_keys)
+# As expressões são montadas direto a partir de pares (variável, coeficiente),
+# evitando as listas intermediárias e as cópias a cada soma do lpSum.
+custo_instalacao_du = LpAffineExpression((y[j], COSTO_INST_DU) for j in nos_du_candidatos)
+custo_instalacao_cu = LpAffineExpression((z[k], COSTO_INST_CU) for k in nos_cu_candidatos)
+
+# Os coeficientes dos links são pré-calculados em listas na mesma ordem de
+# x_keys/w_keys (que é a ordem de x.values()/w.values()) e pareados com zip.
+coefs_fh = [dist_ru_du[chave] * COSTO_LINK_FH for chave in x_keys]
+coefs_mh = [dist_du_cu[chave] * COSTO_LINK_MH for chave in w_keys]
+custo_links_fh = LpAffineExpression(zip(x.values(), coefs_fh))
+custo_links_mh = LpAffineExpression(zip(w.values(), coefs_mh))
 
 # Adiciona a função objetivo completa ao problema
 prob += (custo_instalacao_du + custo_instalacao_cu + 
@@ -190,7 +289,7 @@ print("Adicionando restrições ao modelo...")
 # Restrição 1: Cada RU deve ser atendida por exatamente uma DU.
 for i in nos_ru:
     # Soma todas as conexões X saindo da RU 'i'
-    prob += lpSum(x[i, j] for j in nos_du_candidatos if (i, j) in x_keys) == 1, f"Atendimento_RU_{i}"
+    prob += LpAffineExpression((x[i, j], 1) for j in dus_por_ru[i]) == 1, f"Atendimento_RU_{i}"
 
 # Restrição 2: Uma RU só pode se conectar a uma DU se ela estiver ativa (y[j]=1).
 for (i, j) in x_keys:
@@ -198,8 +297,10 @@ for (i, j) in x_keys:
 
 # Restrição 3: Cada DU ATIVA (y[j]=1) deve ser conectada a exatamente uma CU.
 for j in nos_du_candidatos:
-    # Soma todas as conexões W saindo da DU 'j'
-    prob += lpSum(w[j, k] for k in nos_cu_candidatos if (j, k) in w_keys) == y[j], f"Atendimento_DU_{j}"
+    # Soma todas as conexões W saindo da DU 'j' (com y[j] passado para o lado
+    # esquerdo, o lado direito fica constante: sum(w) - y[j] == 0)
+    prob += LpAffineExpression(chain(((w[j, k], 1) for k in cus_por_du[j]),
+                                     [(y[j], -1)])) == 0, f"Atendimento_DU_{j}"
 
 # Restrição 4: Uma DU só pode se conectar a uma CU se a CU estiver ativa (z[k]=1).
 for (j, k) in w_keys:
@@ -208,50 +309,94 @@ for (j, k) in w_keys:
 # Restrição 5: Capacidade da DU.
 for j in nos_du_candidatos:
     # Soma todas as conexões X entrando na DU 'j'
-    prob += lpSum(x[i, j] for i in nos_ru if (i, j) in x_keys) <= CAP_DU * y[j], f"Capacidade_DU_{j}"
+    prob += LpAffineExpression(chain(((x[i, j], 1) for i in rus_por_du[j]),
+                                     [(y[j], -CAP_DU)])) <= 0, f"Capacidade_DU_{j}"
+
+# Restrição 5b: Uma DU só pode ser ativada se atender pelo menos uma RU.
+# Não muda a solução ótima (DU vazia só acrescenta custo), mas aperta a
+# relaxação linear: y[j] não pode ficar "sobrando" em relação aos x[i,j].
+for j in nos_du_candidatos:
+    prob += LpAffineExpression(chain(((x[i, j], 1) for i in rus_por_du[j]),
+                                     [(y[j], -1)])) >= 0, f"DU_Nao_Vazia_{j}"
 
 # Restrição 6: Capacidade da CU.
 for k in nos_cu_candidatos:
     # Soma todas as conexões W entrando na CU 'k'
-    prob += lpSum(w[j, k] for j in nos_du_candidatos if (j, k) in w_keys) <= CAP_CU * z[k], f"Capacidade_CU_{k}"
+    prob += LpAffineExpression(chain(((w[j, k], 1) for j in dus_por_cu[k]),
+                                     [(z[k], -CAP_CU)])) <= 0, f"Capacidade_CU_{k}"
 
-# Restrição 7: Distância/Latência do Fronthaul (RU -> DU).
-# Um link x[i,j] só pode ser 1 se a distância for menor que o limite.
-for (i, j) in x_keys:
-    if dist_ru_du[i, j] > MAX_DIST_FH_METROS:
-        # Se a distância for maior que o limite, esse link é proibido.
-        prob += x[i, j] == 0, f"Restricao_Dist_FH_{i}_{j}"
-
-# Restrição 8: Distância/Latência do Midhaul (DU -> CU).
-for (j, k) in w_keys:
-    if dist_du_cu[j, k] > MAX_DIST_MH_METROS:
-        # Se a distância for maior que o limite, esse link é proibido.
-        prob += w[j, k] == 0, f"Restricao_Dist_MH_{j}_{k}"
+# Distância/Latência do Fronthaul e do Midhaul: garantidas na própria criação
+# de x e w (5.2), que só contêm os links dentro de MAX_DIST_FH/MAX_DIST_MH.
 
 print("Formulação do problema concluída.")
 
 # ---
 # 6. RESOLUÇÃO DO PROBLEMA
 # ---
+# Warm start: solução inicial gulosa, que dá ao solver um limite primal desde o início
+inicial = solucao_gulosa(nos_ru, x_keys, w_keys, dist_ru_du, dist_du_cu, CAP_DU, CAP_CU)
+usar_warm_start = inicial is not None
+if usar_warm_start:
+    atrib_fh, atrib_mh = inicial
+    cus_abertas = set(atrib_mh.values())
+    for j, var in y.items():
+        var.setInitialValue(1 if j in atrib_mh else 0)
+    for k, var in z.items():
+        var.setInitialValue(1 if k in cus_abertas else 0)
+    for (i, j), var in x.items():
+        var.setInitialValue(1 if atrib_fh[i] == j else 0)
+    for (j, k), var in w.items():
+        var.setInitialValue(1 if atrib_mh.get(j) == k else 0)
+else:
+    print("Heurística gulosa não encontrou solução inicial. Seguindo sem warm start.")
+
 print("\n--- Iniciando Solver PuLP ---")
-# O solver (CBC) tentará encontrar a solução ótima
+# O solver tentará encontrar a solução ótima, dentro do gap relativo e do
+# limite de tempo definidos em 1.5. Ordem de preferência:
+#   1. HiGHS via highspy: o modelo é passado em memória, sem escrever/ler arquivos
+#   2. HiGHS por linha de comando
+#   3. CBC (padrão do PuLP)
+# Com solução inicial (warm start), os solvers por linha de comando vêm
+# primeiro, pois são os que a recebem; o HiGHS via highspy fica por último.
 # Aumentar o raio e o nro de candidatos torna o problema maior, 
 # então podemos dar mais tempo ao solver se necessário.
-# prob.solve(pulp.PULP_CBC_CMD(timeLimit=60)) # Ex: 60 segundos de limite
-prob.solve()
+if usar_warm_start:
+    classes_solver = (pulp.HiGHS_CMD, pulp.PULP_CBC_CMD, pulp.HiGHS)
+else:
+    classes_solver = (pulp.HiGHS, pulp.HiGHS_CMD, pulp.PULP_CBC_CMD)
+for classe_solver in classes_solver:
+    opcoes_solver = dict(msg=False, gapRel=SOLVER_GAP_REL, timeLimit=SOLVER_TIME_LIMIT)
+    # pulp.HiGHS (highspy) não suporta warmStart: a opção seria repassada ao
+    # HiGHS como parâmetro desconhecido e a solução inicial, ignorada.
+    if classe_solver is not pulp.HiGHS:
+        opcoes_solver['warmStart'] = usar_warm_start
+    solver = classe_solver(**opcoes_solver)
+    if solver.available():
+        break
+print(f"Solver utilizado: {solver.name}")
+prob.solve(solver)
 print(f"Status da Solução: {pulp.LpStatus[prob.status]}")
+# Com gap relativo e limite de tempo, o status "Optimal" não garante uma solução
+# comprovadamente ótima: o sol_status distingue a ótima (dentro do gap) da
+# melhor solução viável encontrada até o limite de tempo.
+solucao_encontrada = prob.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible)
 
 # ---
 # 7. APRESENTAÇÃO DOS RESULTADOS (Terminal)
 # ---
 
-if pulp.LpStatus[prob.status] == "Optimal":
-    print(f"Custo Total Ótimo Encontrado: {pulp.value(prob.objective):.2f}")
+if solucao_encontrada:
+    if prob.sol_status == pulp.LpSolutionOptimal:
+        print(f"Custo Total Ótimo Encontrado (gap relativo de até {SOLVER_GAP_REL:.0%}): "
+              f"{pulp.value(prob.objective):.2f}")
+    else:
+        print(f"Custo Total da Melhor Solução Encontrada: {pulp.value(prob.objective):.2f}")
+        print(f"  (Limite de tempo de {SOLVER_TIME_LIMIT}s atingido: solução não comprovadamente ótima.)")
 
     print("\n--- DUs Ativadas ---")
     d_ativas = []
     for j in nos_du_candidatos:
-        if y[j].varValue == 1:
+        if y[j].varValue > 0.9:
             d_ativas.append(j)
             print(f"  [+] DU ativada no nó: {j}")
     print(f"Total de DUs ativadas: {len(d_ativas)} / {len(nos_du_candidatos)}")
@@ -259,7 +404,7 @@ if pulp.LpStatus[prob.status] == "Optimal":
     print("\n--- CUs Ativadas ---")
     c_ativas = []
     for k in nos_cu_candidatos:
-        if z[k].varValue == 1:
+        if z[k].varValue > 0.9:
             c_ativas.append(k) # <-- Corrigido um bug aqui (estava 'j')
             print(f"  [+] CU ativada no nó: {k}")
     print(f"Total de CUs ativadas: {len(c_ativas)} / {len(nos_cu_candidatos)}")
@@ -267,13 +412,13 @@ if pulp.LpStatus[prob.status] == "Optimal":
     print("\n--- Conexões da Rede ---")
     conexoes_ru_du = []
     for (i, j) in x_keys:
-        if x[i, j].varValue == 1:
+        if x[i, j].varValue > 0.9:
             conexoes_ru_du.append((i, j))
             print(f"  RU {i}  == (Fronthaul) ==> DU {j}  (Dist: {dist_ru_du[i, j]:.0f}m)")
 
     conexoes_du_cu = []
     for (j, k) in w_keys:
-        if w[j, k].varValue == 1:
+        if w[j, k].varValue > 0.9:
             conexoes_du_cu.append((j, k))
             print(f"  DU {j}  == (Midhaul)   ==> CU {k}  (Dist: {dist_du_cu[j, k]:.0f}m)")
                 
@@ -287,13 +432,13 @@ elif pulp.LpStatus[prob.status] == "Infeasible":
     print("  4. (Sorteio) Uma RU foi sorteada em um 'beco sem saída' do mapa (ilha).")
     print("\nTente relaxar as restrições e rodar novamente.")
 else:
-    print("O solver não encontrou uma solução ótima.")
+    print("O solver não encontrou uma solução viável.")
 
 
 # ---
 # 8. VISUALIZAÇÃO DOS RESULTADOS (Folium)
 # ---
-if pulp.LpStatus[prob.status] == "Optimal":
+if solucao_encontrada:
     print("\nGerando mapa de visualização...")
     
     # Cria o mapa centrado no local
@@ -307,67 +452,72 @@ if pulp.LpStatus[prob.status] == "Optimal":
     def get_coords(node):
         return (G_undir.nodes[node]['y'], G_undir.nodes[node]['x'])
 
+    # Monta uma FeatureCollection (GeoJSON) com as rotas já calculadas na seção 4,
+    # para desenhar todos os links de um tipo numa única camada.
+    def gerar_camada_rotas(conexoes, rotas, distancias, rotulo):
+        features = []
+        for (a, b) in conexoes:
+            if (a, b) not in rotas:
+                print(f"Aviso: Não foi possível desenhar rota para {rotulo} {a} -> {b}")
+                continue
+            features.append({
+                "type": "Feature",
+                "properties": {"descricao": f"{rotulo}: {a} -> {b}<br>Dist: {distancias[a, b]:.0f}m"},
+                "geometry": {
+                    "type": "LineString",
+                    # GeoJSON usa a ordem (lon, lat)
+                    "coordinates": [[G_undir.nodes[n]['x'], G_undir.nodes[n]['y']] for n in rotas[a, b]],
+                },
+            })
+        return {"type": "FeatureCollection", "features": features}
+
     # Desenha os links de Fronthaul (RU -> DU)
-    for (i, j) in conexoes_ru_du:
-        try:
-            path = nx.shortest_path(G_undir, i, j, weight='length')
-            coords = [get_coords(n) for n in path]
-            folium.PolyLine(coords, color='blue', weight=2, opacity=0.7, 
-                            popup=f"FH: {i} -> {j}\nDist: {dist_ru_du[i, j]:.0f}m").add_to(m)
-        except nx.NetworkXNoPath:
-            print(f"Aviso: Não foi possível desenhar rota para FH {i} -> {j}")
+    folium.GeoJson(gerar_camada_rotas(conexoes_ru_du, rotas_ru_du, dist_ru_du, "FH"),
+                   name="Fronthaul",
+                   style_function=lambda x: {'color': 'blue', 'weight': 2, 'opacity': 0.7},
+                   popup=folium.GeoJsonPopup(fields=["descricao"], labels=False)).add_to(m)
 
     # Desenha os links de Midhaul (DU -> CU)
-    for (j, k) in conexoes_du_cu:
-        try:
-            path = nx.shortest_path(G_undir, j, k, weight='length')
-            coords = [get_coords(n) for n in path]
-            folium.PolyLine(coords, color='red', weight=3, opacity=0.8, 
-                            popup=f"MH: {j} -> {k}\nDist: {dist_du_cu[j, k]:.0f}m").add_to(m)
-        except nx.NetworkXNoPath:
-            print(f"Aviso: Não foi possível desenhar rota para MH {j} -> {k}")
+    folium.GeoJson(gerar_camada_rotas(conexoes_du_cu, rotas_du_cu, dist_du_cu, "MH"),
+                   name="Midhaul",
+                   style_function=lambda x: {'color': 'red', 'weight': 3, 'opacity': 0.8},
+                   popup=folium.GeoJsonPopup(fields=["descricao"], labels=False)).add_to(m)
 
     # Adiciona os marcadores dos elementos
-    
+    # Todos os marcadores vão numa única camada FastMarkerCluster: cada linha
+    # de dados é [lat, lon, cor, ícone, opacidade, tooltip] e o callback em JS
+    # monta o ícone no navegador, em vez de um objeto folium.Marker por elemento.
+    marcadores = []
+
     # RUs
     for i in nos_ru:
-        folium.Marker(
-            location=get_coords(i),
-            tooltip=f"RU (Nó: {i})",
-            icon=folium.Icon(color='green', icon='broadcast-tower', prefix='fa')
-        ).add_to(m)
+        marcadores.append([*get_coords(i), 'green', 'broadcast-tower', 1.0, f"RU (Nó: {i})"])
 
     # DUs (Ativas e Inativas)
+    d_ativas_set = set(d_ativas)
     for j in nos_du_candidatos:
-        if j in d_ativas:
-            folium.Marker(
-                location=get_coords(j),
-                tooltip=f"DU ATIVADA (Nó: {j})",
-                icon=folium.Icon(color='blue', icon='server', prefix='fa')
-            ).add_to(m)
+        if j in d_ativas_set:
+            marcadores.append([*get_coords(j), 'blue', 'server', 1.0, f"DU ATIVADA (Nó: {j})"])
         else:
-            folium.Marker(
-                location=get_coords(j),
-                tooltip=f"Candidato DU Inativo (Nó: {j})",
-                icon=folium.Icon(color='gray', icon='server', prefix='fa'),
-                opacity=0.5
-            ).add_to(m)
+            marcadores.append([*get_coords(j), 'gray', 'server', 0.5, f"Candidato DU Inativo (Nó: {j})"])
 
     # CUs (Ativas e Inativas)
+    c_ativas_set = set(c_ativas)
     for k in nos_cu_candidatos:
-        if k in c_ativas:
-            folium.Marker(
-                location=get_coords(k),
-                tooltip=f"CU ATIVADA (Nó: {k})",
-                icon=folium.Icon(color='red', icon='database', prefix='fa')
-            ).add_to(m)
+        if k in c_ativas_set:
+            marcadores.append([*get_coords(k), 'red', 'database', 1.0, f"CU ATIVADA (Nó: {k})"])
         else:
-            folium.Marker(
-                location=get_coords(k),
-                tooltip=f"Candidato CU Inativo (Nó: {k})",
-                icon=folium.Icon(color='gray', icon='database', prefix='fa'),
-                opacity=0.5
-            ).add_to(m)
+            marcadores.append([*get_coords(k), 'gray', 'database', 0.5, f"Candidato CU Inativo (Nó: {k})"])
+
+    callback_marcador = """
+    function (row) {
+        var icon = L.AwesomeMarkers.icon({markerColor: row[2], icon: row[3], prefix: 'fa'});
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon, opacity: row[4]});
+        marker.bindTooltip(row[5]);
+        return marker;
+    };
+    """
+    FastMarkerCluster(data=marcadores, callback=callback_marcador).add_to(m)
 
     # Salva o mapa em um arquivo HTML
     output_filename = "mapa_solucao_openran.html"
@@ -375,8 +525,8 @@ if pulp.LpStatus[prob.status] == "Optimal":
     print(f"\nMapa salvo com sucesso em: {output_filename}")
     print("Abra este arquivo em seu navegador para ver a solução.")
     
-    # Adiciona try/except para o desenho das rotas,
-    # pois get_street_distance pode retornar 'infinito' e nx.shortest_path falharia
+    # As rotas desenhadas são as mesmas calculadas na seção 4; links sem rota
+    # (distância 'infinita') são apenas avisados no terminal.
     # Também ajustei o zoom do mapa para 14, para vermos a área maior.
     # Corrigi um pequeno bug de copiar/colar (c_ativas.append(j) virou c_ativas.append(k))
 